@@ -0,0 +1,24 @@
+# Puts the repository root on sys.path so the tests can import the model scripts.
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+
+@pytest.fixture
+def make_settlements():
+    """Factory of random settlements carrying every column read by the scoring and financial models."""
+    def make(n=50, seed=0):
+        rng = np.random.default_rng(seed)
+        return gpd.GeoDataFrame({
+            'name': [f'site{i}' for i in range(n)],
+            'pop': rng.lognormal(7, 1.2, n).round(),
+            'pop_den': rng.lognormal(4, 1, n),
+            'nightlight_intensity': rng.exponential(2, n),
+            'commercial_facilities_count': rng.poisson(3, n).astype(float),
+            'solar_ghi': rng.uniform(4.5, 7.5, n),
+            'distance_to_grid_km': rng.uniform(0, 150, n),
+            'schools_count': rng.poisson(0.8, n).astype(float),
+            'health_facilities_count': rng.poisson(0.4, n).astype(float),
+        }, geometry=[Point(x, y) for x, y in rng.uniform(3, 13, (n, 2))], crs='EPSG:4326')
+    return make
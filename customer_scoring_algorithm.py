@@ -3,139 +3,279 @@ import pandas as pd
 import numpy as np
 import os
 
-def normalize_score(series, reverse=False, log_scale=False):
+# Composite scores as weighted sums of metrics. Normalized metrics are keyed by their
+# (column, log_scale, reverse) triple, the options applied by normalize_matrix: each distinct
+# triple is normalized once, however many scores use it.
+SCORECARD = {
+    # --- 1. MARKET SIZE SCORE (25%) ---
+    # Metric: Measures the raw potential customer base.
+    # Note: Log scale used to reduce the bias of massive outliers (e.g., large towns vs villages).
+    'market_size_score': {
+        ('pop', True, False): 0.7,
+        ('pop_den', True, False): 0.3
+    },
+
+    # --- 2. REVENUE POTENTIAL SCORE (25%) ---
+    # Metric: Proxies for economic activity (Nightlights and Commercial clusters).
+    'revenue_potential_score': {
+        ('nightlight_intensity', True, False): 0.6,
+        ('commercial_facilities_count', False, False): 0.4
+    },
+
+    # --- 3. COST EFFICIENCY SCORE (20%) ---
+    # Metric: Technical feasibility. Higher Solar GHI (Irradiance) is better.
+    # Distance to Grid: Typically, mini-grids target off-grid areas, so further is often 'better' 
+    # to avoid grid encroachment risk (hence no reversal of the distance metric).
+    'cost_efficiency_score': {
+        ('solar_ghi', False, False): 0.7,
+        ('distance_to_grid_km', False, False): 0.3
+    },
+
+    # --- 4. ACCESSIBILITY SCORE (15%) ---
+    # Metric: Infrastructure presence.
+    # Normalized individually to prevent one metric (e.g., small shops) from skewing the total.
+    'accessibility_score': {
+        ('schools_count', False, False): 0.4,
+        ('health_facilities_count', False, False): 0.4,
+        ('commercial_facilities_count', False, False): 0.2
+    },
+
+    # --- 5. STRATEGIC VALUE SCORE (15%) ---
+    # Metric: "Anchor Customer" presence.
+    # Focuses purely on the binary PRESENCE of key institutions (School/Hospital),
+    # as these often serve as reliable payers (Anchor Load). Not normalized: see ANCHOR_METRIC.
+    'strategic_value_score': {
+        'anchor_score': 1.0
+    }
+}
+# Raw (non-normalized) metric computed in calculate_viability_scores
+ANCHOR_METRIC = 'anchor_score'
+
+# --- TOTAL WEIGHTED SCORE ---
+SCORE_WEIGHTS = {
+    'market_size_score': 0.25,
+    'revenue_potential_score': 0.25,
+    'cost_efficiency_score': 0.20,
+    'accessibility_score': 0.15,
+    'strategic_value_score': 0.15
+}
+
+def normalize_matrix(values, log_mask, reverse_mask=None):
     """
-    Normalizes a pandas Series to a 0-100 scale using Min-Max scaling.
-    
+    Normalizes every column of a 2-D array to a 0-100 scale using Min-Max scaling.
+    All metrics of the SCORECARD are scaled in one pass, one column per distinct
+    (column, log_scale, reverse) metric.
+    Note: values is transformed in place to avoid allocating intermediate arrays.
+
     Args:
-        series (pd.Series): The numerical data to normalize.
-        reverse (bool): If True, lower values get higher scores (e.g., for distance metrics).
-        log_scale (bool): If True, applies log transformation (np.log1p) to handle skewed data.
-        
+        values (np.ndarray): (n_sites, n_metrics) float array with missing values already filled.
+        log_mask (np.ndarray): Boolean mask of columns to log-transform (np.log1p) before scaling.
+        reverse_mask (np.ndarray): Boolean mask of columns where lower values get higher scores.
+
     Returns:
-        pd.Series: Normalized scores from 0 to 100.
+        np.ndarray: Normalized scores from 0 to 100, same shape as values.
     """
-    # 1. Fill missing values with 0 to prevent calculation errors
-    series = series.fillna(0)
+    if len(values) == 0:
+        return values
+
+    offset, scale = _normalization_coefficients(values, log_mask, reverse_mask)
+
+    # 2. Calculate normalization for all columns at once
+    values *= scale
+    values += offset
+
+    return values
+
+def _normalization_coefficients(values, log_mask, reverse_mask=None):
+    """
+    Log-transforms the log_mask columns of values in place and returns per-column (offset, scale)
+    such that offset + scale * value is the 0-100 Min-Max score used by normalize_matrix.
+    """
+    # 1. Log-transform the skewed columns only (e.g., Population counts often follow power laws)
+    values[:, log_mask] = np.log1p(values[:, log_mask])
+
+    # NaN-aware bounds: an out-of-domain value (e.g. log1p of a negative) only affects its own row
+    min_vals = np.nanmin(values, axis=0)
+    span = np.nanmax(values, axis=0) - min_vals
 
-    # 2. Log-transform skewed data (e.g., Population counts often follow power laws)
-    if log_scale:
-        series = np.log1p(series)
+    # Avoid division by zero for columns whose values are all identical
+    flat = span == 0
+    span[flat] = 1
 
-    min_val = series.min()
-    max_val = series.max()
+    scale = 100 / span
+    offset = -min_vals * scale
+    if reverse_mask is not None:
+        scale[reverse_mask] = -scale[reverse_mask]
+        offset[reverse_mask] = 100 - offset[reverse_mask]
 
-    # Avoid division by zero if all values are identical
-    if max_val == min_val:
-        return pd.Series([50] * len(series), index=series.index)
+    # Identical columns get a neutral score of 50 (zeroed so that missing entries score 50 too)
+    scale[flat] = 0
+    offset[flat] = 50
+    values[:, flat] = 0
 
-    # 3. Calculate normalization
-    normalized = ((series - min_val) / (max_val - min_val)) * 100
+    return offset, scale
 
-    if reverse:
-        normalized = 100 - normalized
+def _weight_matrix(scorecard, metrics):
+    """
+    Expands a {score: {metric: weight}} scorecard into an (n_metrics, n_scores) weight matrix,
+    so that every composite score is obtained with a single matrix multiply.
+    """
+    matrix = np.zeros((len(metrics), len(scorecard)), dtype=np.float32)
+    for col, weights in enumerate(scorecard.values()):
+        for metric, weight in weights.items():
+            matrix[metrics.index(metric), col] = weight
+    return matrix
+
+# Optional JIT kernel: with numba installed, normalization and weighting run as one fused,
+# multi-threaded pass over the sites, without materializing the normalized metric matrix.
+try:
+    from numba import njit, prange
+except ImportError:
+    _score_kernel = None
+else:
+    @njit(parallel=True, cache=True)
+    def _score_kernel(values, anchor_score, offset, scale, weight_matrix, score_weights):
+        """
+        Fused normalization + weighting, one site per iteration.
+        values is already log-transformed and offset/scale come from _normalization_coefficients,
+        so the scores match normalize_matrix; the anchor score is the last weight_matrix row.
+        Returns the (n_sites, n_scores) composite scores and the total score.
+        """
+        n_sites, n_metrics = values.shape
+        n_scores = weight_matrix.shape[1]
+
+        composite = np.empty((n_sites, n_scores), dtype=np.float32)
+        total = np.empty(n_sites, dtype=np.float32)
+        for i in prange(n_sites):
+            for k in range(n_scores):
+                composite[i, k] = anchor_score[i] * weight_matrix[n_metrics, k]
 
-    return normalized
+            for j in range(n_metrics):
+                score = offset[j] + scale[j] * values[i, j]
+                for k in range(n_scores):
+                    # Zero weights are skipped so that a NaN metric only reaches the scores using it
+                    if weight_matrix[j, k] != 0:
+                        composite[i, k] += score * weight_matrix[j, k]
 
-def calculate_viability_scores(input_path, output_path):
+            site_total = np.float32(0)
+            for k in range(n_scores):
+                site_total += composite[i, k] * score_weights[k]
+            total[i] = site_total
+
+        return composite, total
+
+def calculate_viability_scores(input_path, output_path, geojson_path=None):
     """
     Loads settlement data, calculates weighted viability scores for mini-grid suitability,
-    and saves the ranked results to a new GeoJSON file.
+    and saves the ranked results to output_path: GeoParquet for a '.parquet' path
+    (fastest hand-off to the financial model), GeoJSON otherwise.
+    A GeoJSON copy for GIS tools is only written when geojson_path is given.
     """
     print(f"Loading data from {input_path}...")
     
     try:
-        settlements = gpd.read_file(input_path)
+        settlements = gpd.read_file(input_path, engine='pyogrio')
     except Exception as e:
         print(f"Error loading file: {e}")
         return
 
     print("Calculating viability scores...")
 
-    # --- 1. MARKET SIZE SCORE (25%) ---
-    # Metric: Measures the raw potential customer base.
-    # Note: Log scale used to reduce the bias of massive outliers (e.g., large towns vs villages).
-    settlements['market_size_score'] = (
-        normalize_score(settlements['pop'], log_scale=True) * 0.7 +
-        normalize_score(settlements['pop_den'], log_scale=True) * 0.3
-    )
+    # Detach geometry: scoring is plain tabular math, re-attached only for saving
+    geometry = settlements.geometry
+    settlements = pd.DataFrame(settlements.drop(columns=geometry.name))
 
-    # --- 2. REVENUE POTENTIAL SCORE (25%) ---
-    # Metric: Proxies for economic activity (Nightlights and Commercial clusters).
-    settlements['revenue_potential_score'] = (
-        normalize_score(settlements['nightlight_intensity'], log_scale=True) * 0.6 +
-        normalize_score(settlements['commercial_facilities_count']) * 0.4
-    )
+    # Distinct (column, log_scale, reverse) metrics across all scores, each normalized once
+    norm_metrics = list(dict.fromkeys(
+        metric
+        for weights in SCORECARD.values()
+        for metric in weights
+        if metric != ANCHOR_METRIC
+    ))
+    columns, log_scale, reverse = (np.array(options) for options in zip(*norm_metrics))
 
-    # --- 3. COST EFFICIENCY SCORE (20%) ---
-    # Metric: Technical feasibility. Higher Solar GHI (Irradiance) is better.
-    # Distance to Grid: Typically, mini-grids target off-grid areas, so further is often 'better' 
-    # to avoid grid encroachment risk.
-    settlements['cost_efficiency_score'] = (
-        normalize_score(settlements['solar_ghi']) * 0.7 +
-        normalize_score(settlements['distance_to_grid_km'], reverse=False) * 0.3
-    )
-
-    # --- 4. ACCESSIBILITY SCORE (15%) ---
-    # Metric: Infrastructure presence.
-    # Normalized individually to prevent one metric (e.g., small shops) from skewing the total.
-    settlements['accessibility_score'] = (
-        normalize_score(settlements['schools_count']) * 0.4 +
-        normalize_score(settlements['health_facilities_count']) * 0.4 +
-        normalize_score(settlements['commercial_facilities_count']) * 0.2
-    )
+    # Missing values count as 0.
+    # Scores are dimensionless (0-100), so the metric matrix is kept in single precision
+    # to halve its memory footprint.
+    values = settlements[list(columns)].to_numpy(dtype=np.float32, na_value=0.0)
 
-    # --- 5. STRATEGIC VALUE SCORE (15%) ---
-    # Metric: "Anchor Customer" presence.
-    # Focuses purely on the binary PRESENCE of key institutions (School/Hospital),
-    # as these often serve as reliable payers (Anchor Load).
+    # "Anchor Customer" points: 60 for a health facility, 40 for a school.
+    # Computed branchlessly on the uint8 views of the presence masks (max 100 fits in uint8),
+    # then weighted as an extra column of the metric matrix.
     anchor_score = (
-        (settlements['health_facilities_count'] > 0).astype(int) * 60 + 
-        (settlements['schools_count'] > 0).astype(int) * 40             
+        (settlements['health_facilities_count'].to_numpy() > 0).view(np.uint8) * np.uint8(60) +
+        (settlements['schools_count'].to_numpy() > 0).view(np.uint8) * np.uint8(40)
     )
-    settlements['strategic_value_score'] = anchor_score 
-
-    # --- TOTAL WEIGHTED SCORE ---
-    weights = {
-        'market_size_score': 0.25,
-        'revenue_potential_score': 0.25,
-        'cost_efficiency_score': 0.20,
-        'accessibility_score': 0.15,
-        'strategic_value_score': 0.15
-    }
 
-    settlements['total_score'] = sum(
-        settlements[score] * weight
-        for score, weight in weights.items()
-    )
+    weight_matrix = _weight_matrix(SCORECARD, norm_metrics + [ANCHOR_METRIC])
+    score_weights = np.array([SCORE_WEIGHTS[score] for score in SCORECARD], dtype=np.float32)
+
+    if _score_kernel is not None and len(values) > 0:
+        # Fused normalization + weighting, see _score_kernel
+        offset, scale = _normalization_coefficients(values, log_scale, reverse)
+        composite, total = _score_kernel(values, anchor_score, offset, scale, weight_matrix, score_weights)
+    else:
+        # Normalize all metrics in a single vectorized pass, then each composite score
+        # as a dot product over its own metrics only: a NaN metric must not leak into the
+        # scores that do not use it (NaN * 0 is NaN)
+        norm = normalize_matrix(values, log_scale, reverse)
+        metric_matrix = np.hstack([norm, anchor_score[:, np.newaxis].astype(np.float32)])
+        composite = np.empty((len(metric_matrix), len(SCORECARD)), dtype=np.float32)
+        for k, weights in enumerate(weight_matrix.T):
+            used = np.flatnonzero(weights)
+            composite[:, k] = np.take(metric_matrix, used, axis=1) @ weights[used]
+        total = composite @ score_weights
+
+    settlements[list(SCORECARD)] = composite
+    settlements['total_score'] = total
 
     # --- RANK & TIER ---
-    settlements = settlements.sort_values('total_score', ascending=False)
-    settlements['rank'] = range(1, len(settlements) + 1)
+    # Ranks are scattered through the sort order instead of re-ordering the whole frame
+    # (geometry included); downstream consumers rely on the 'rank' column.
+    ranking = np.argsort(-settlements['total_score'].to_numpy(), kind='stable')
+    ranks = np.empty(len(ranking), dtype=np.int32)
+    ranks[ranking] = np.arange(1, len(ranking) + 1, dtype=np.int32)
+    settlements['rank'] = ranks
 
     # Categorize into simple tiers for business decision making
-    settlements['viability_tier'] = pd.cut(
-        settlements['total_score'],
-        bins=[0, 40, 70, 100],
-        labels=['Low', 'Medium', 'High']
+    # Tiers: Low (<= 40), Medium (40-70], High (> 70). Binary search on the tier edges
+    # yields the categorical codes directly; sites without a valid score get no tier (code -1).
+    total_scores = settlements['total_score'].to_numpy()
+    tier_codes = np.searchsorted([40.0, 70.0], total_scores)
+    tier_codes[np.isnan(total_scores)] = -1
+    settlements['viability_tier'] = pd.Categorical.from_codes(
+        tier_codes,
+        categories=['Low', 'Medium', 'High'],
+        ordered=True
     )
 
     # Save Results
+    settlements = gpd.GeoDataFrame(settlements, geometry=geometry)
+
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
-    settlements.to_file(output_path, driver='GeoJSON')
+    # GeoParquet keeps binary floats and geometry: much faster to write and re-load than GeoJSON text
+    if output_path.endswith('.parquet'):
+        settlements.to_parquet(output_path)
+    else:
+        settlements.to_file(output_path, driver='GeoJSON', engine='pyogrio')
     print(f"Scoring complete. Results saved to {output_path}")
+
+    if geojson_path:
+        os.makedirs(os.path.dirname(geojson_path), exist_ok=True)
+        settlements.to_file(geojson_path, driver='GeoJSON', engine='pyogrio')
+        print(f"GeoJSON copy saved to {geojson_path}")
     
     # Validation Print (Sanity Check)
     if not settlements.empty:
-        top_site = settlements.iloc[0]
+        top_site = settlements.iloc[ranking[0]]
         # Use .get() to avoid errors if 'name' column is missing in test data
         print(f"Top Ranked Site: {top_site.get('name', 'Unknown Location')} - Score: {top_site['total_score']:.1f}")
 
 if __name__ == "__main__":
     # Define paths (Relative paths for portability)
     INPUT_FILE = './data/raw_settlements.geojson'
-    OUTPUT_FILE = './output/scored_settlements.geojson'
+    OUTPUT_FILE = './output/scored_settlements.parquet'
     
     calculate_viability_scores(INPUT_FILE, OUTPUT_FILE)
\ No newline at end of file
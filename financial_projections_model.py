@@ -1,6 +1,8 @@
 import geopandas as gpd
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import os
 
 # --- 1. GLOBAL ASSUMPTIONS (The "Control Panel") ---
@@ -21,6 +23,67 @@ COLLECTION_RATE = 0.85          # 85% Collection Efficiency (15% Technical/Comme
 DISCOUNT_RATE = 0.12            # 12% WACC (Weighted Average Cost of Capital)
 PROJECT_LIFETIME = 10           # Analysis period in Years
 
+_LOGISTICS_PENALTY_PER_KM = 0.1 / 100   # +10% CAPEX per 100km from the grid
+
+# --- 2. OPTIONAL JIT KERNEL ---
+# With numba installed, Phases 1-3 run as one fused, multi-threaded pass over the sites:
+# the three input columns are read once and every output column is written once,
+# instead of allocating an intermediate pandas Series per step.
+# Assumptions are passed in as arguments: numba would freeze globals at compile time.
+PROJECTION_COLUMNS = [
+    'estimated_customers', 'estimated_demand_kwh_day', 'system_size_kw',
+    'capex_estimate_usd', 'opex_annual_usd', 'revenue_annual_usd', 'annual_cashflow_usd',
+    'payback_years', 'npv_10yr_usd', 'simple_yield_percent'
+]
+
+try:
+    from numba import njit, prange
+except ImportError:
+    _project_financials_kernel = None
+else:
+    @njit(parallel=True, cache=True)
+    def _project_financials_kernel(pop, ghi, dist, household_size, penetration, kwh_per_customer,
+                                   baseline_ghi, kw_per_kwh_day_at_ghi, capex_per_kw,
+                                   logistics_penalty_per_km, opex_percent, revenue_per_customer_yr,
+                                   annuity_factor):
+        """
+        Scalar re-statement of Phases 1-3 of run_financial_projections, one site per iteration.
+        Returns the arrays listed in PROJECTION_COLUMNS, in that order.
+        """
+        n = pop.shape[0]
+        customers = np.empty(n, dtype=np.int32)
+        demand = np.empty(n)
+        system_kw = np.empty(n)
+        capex = np.empty(n)
+        opex = np.empty(n)
+        revenue = np.empty(n)
+        cashflow = np.empty(n)
+        payback = np.empty(n)
+        npv = np.empty(n)
+        yield_pct = np.empty(n)
+
+        for i in prange(n):
+            # Phase 1: Engineering sizing (missing or zero GHI falls back to the baseline)
+            customers[i] = int((pop[i] / household_size) * penetration)
+            demand[i] = customers[i] * kwh_per_customer
+            site_ghi = ghi[i]
+            if np.isnan(site_ghi) or site_ghi == 0:
+                site_ghi = baseline_ghi
+            system_kw[i] = demand[i] * kw_per_kwh_day_at_ghi / site_ghi
+
+            # Phase 2: CAPEX (with logistics penalty), OPEX & Revenue
+            capex[i] = system_kw[i] * capex_per_kw * (1 + dist[i] * logistics_penalty_per_km)
+            opex[i] = capex[i] * opex_percent
+            revenue[i] = customers[i] * revenue_per_customer_yr
+
+            # Phase 3: Financial metrics
+            cashflow[i] = revenue[i] - opex[i]
+            payback[i] = capex[i] / cashflow[i] if cashflow[i] > 0 else 999.0
+            npv[i] = -capex[i] + (cashflow[i] * annuity_factor)
+            yield_pct[i] = (cashflow[i] / capex[i]) * 100 if capex[i] > 0 else 0.0
+
+        return customers, demand, system_kw, capex, opex, revenue, cashflow, payback, npv, yield_pct
+
 def run_financial_projections(input_path, output_dir):
     """
     Performs technoeconomic modeling on scored settlements.
@@ -28,78 +91,115 @@ def run_financial_projections(input_path, output_dir):
     """
     print("--- Starting Financial Projection Engine ---")
     
-    # Load Data
+    # Load Data (GeoParquet from the scoring step, or any vector file readable by pyogrio)
     try:
-        settlements = gpd.read_file(input_path)
+        if input_path.endswith('.parquet'):
+            settlements = gpd.read_parquet(input_path)
+        else:
+            settlements = gpd.read_file(input_path, engine='pyogrio')
     except Exception as e:
         print(f"Error loading input file: {e}")
         return
 
     print(f"Loaded {len(settlements)} sites. Calculating projections...")
 
-    # --- PHASE 1: ENGINEERING SIZING ---
-    
-    # 1. Estimate Total Load
-    # Logic: Population -> Households -> Customers -> Total Daily kWh
-    households = settlements['pop'] / AVG_HOUSEHOLD_SIZE
-    settlements['estimated_customers'] = (households * CUSTOMER_PENETRATION).astype(int)
-    settlements['estimated_demand_kwh_day'] = settlements['estimated_customers'] * DAILY_KWH_PER_CUSTOMER
-
-    # 2. System Sizing (Solar PV Capacity)
-    # Logic: Adjust local GHI against baseline. If local sun is stronger, we need fewer panels.
-    # Formula: (Demand / Peak Sun Hours) * Oversizing_Factor
-    ghi_factor = settlements['solar_ghi'].fillna(BASELINE_GHI).replace(0, BASELINE_GHI) / BASELINE_GHI
-    settlements['system_size_kw'] = (settlements['estimated_demand_kwh_day'] / (ghi_factor * 4)) * SYSTEM_OVERSIZING
-
-    # --- PHASE 2: CAPEX & OPEX MODELING ---
-
-    # 3. CAPEX Calculation with Logistics Penalty
-    # Logic: Projects further from the grid are harder to reach. 
-    # Penalty: Add 10% cost for every 100km distance from the main grid.
-    logistics_mult = 1 + (settlements['distance_to_grid_km'] / 100) * 0.1
-    settlements['capex_estimate_usd'] = settlements['system_size_kw'] * CAPEX_PER_KW * logistics_mult
-
-    # 4. Operating Expenses & Revenue
-    settlements['opex_annual_usd'] = settlements['capex_estimate_usd'] * OPEX_PERCENT
-    
-    # Revenue = Annual Energy Sold * Tariff * Collection Rate
-    annual_energy_sales = settlements['estimated_demand_kwh_day'] * 365
-    settlements['revenue_annual_usd'] = annual_energy_sales * TARIFF_PER_KWH * COLLECTION_RATE
-
-    # --- PHASE 3: FINANCIAL METRICS (The "Bankability" Check) ---
-
-    # 5. Cash Flow Analysis
-    annual_cashflow = settlements['revenue_annual_usd'] - settlements['opex_annual_usd']
-    settlements['annual_cashflow_usd'] = annual_cashflow
-
-    # Metric A: Payback Period (Years)
-    # Logic: How many years to earn back the initial CAPEX?
-    # Handle negative cashflows (projects that lose money) by assigning a Sentinel Value (999)
-    settlements['payback_years'] = np.where(
-        annual_cashflow > 0,
-        settlements['capex_estimate_usd'] / annual_cashflow,
-        999 
-    )
+    # Detach geometry: the projections are plain tabular math, re-attached only for the GeoJSON export
+    geometry = settlements.geometry
+    settlements = pd.DataFrame(settlements.drop(columns=geometry.name))
 
-    # Metric B: Net Present Value (NPV)
-    # Logic: Determine the value of future cash flows in today's dollars using the Annuity Formula.
-    # Formula: NPV = -Investment + (Annual_Cashflow * Annuity_Factor)
+    # Derived constants, evaluated once per run (not per site) so that scenario
+    # overrides of the global assumptions are picked up
     annuity_factor = (1 - (1 + DISCOUNT_RATE) ** (-PROJECT_LIFETIME)) / DISCOUNT_RATE
-    settlements['npv_10yr_usd'] = -settlements['capex_estimate_usd'] + (annual_cashflow * annuity_factor)
-
-    # Metric C: Simple Yield (First Year ROI)
-    with np.errstate(divide='ignore', invalid='ignore'):
-        settlements['simple_yield_percent'] = (annual_cashflow / settlements['capex_estimate_usd']) * 100
-        # Clean up infinite values for sites with 0 CAPEX (edge cases)
-        settlements['simple_yield_percent'] = settlements['simple_yield_percent'].replace([np.inf, -np.inf], 0).fillna(0)
+    revenue_per_customer_yr = DAILY_KWH_PER_CUSTOMER * 365 * TARIFF_PER_KWH * COLLECTION_RATE
+    kw_per_kwh_day_at_ghi = BASELINE_GHI / 4 * SYSTEM_OVERSIZING  # Divide by local GHI for kW per kWh/day
+
+    # Raw input arrays: all projection arithmetic runs on NumPy, not on pandas Series
+    # (kept in double precision since the outputs are currency amounts)
+    # Missing population counts as 0 customers (as in the scoring step), in both paths
+    pop = settlements['pop'].to_numpy(dtype=np.float64, na_value=0.0)
+    ghi = settlements['solar_ghi'].to_numpy(dtype=np.float64, na_value=np.nan)
+    dist = settlements['distance_to_grid_km'].to_numpy(dtype=np.float64)
+
+    if _project_financials_kernel is not None:
+        # Fused single pass over the sites (Phases 1-3), see _project_financials_kernel
+        outputs = _project_financials_kernel(
+            pop, ghi, dist,
+            AVG_HOUSEHOLD_SIZE, CUSTOMER_PENETRATION, DAILY_KWH_PER_CUSTOMER,
+            BASELINE_GHI, kw_per_kwh_day_at_ghi, CAPEX_PER_KW,
+            _LOGISTICS_PENALTY_PER_KM, OPEX_PERCENT, revenue_per_customer_yr,
+            annuity_factor
+        )
+    else:
+        # --- PHASE 1: ENGINEERING SIZING ---
+
+        # 1. Estimate Total Load
+        # Logic: Population -> Households -> Customers -> Total Daily kWh
+        households = pop / AVG_HOUSEHOLD_SIZE
+        customers = (households * CUSTOMER_PENETRATION).astype(np.int32)
+        demand = customers * DAILY_KWH_PER_CUSTOMER
+
+        # 2. System Sizing (Solar PV Capacity)
+        # Logic: Adjust local GHI against baseline. If local sun is stronger, we need fewer panels.
+        # Formula: (Demand / Peak Sun Hours) * Oversizing_Factor, with Peak Sun Hours = 4 * GHI / BASELINE_GHI
+        local_ghi = np.where(np.isnan(ghi) | (ghi == 0), BASELINE_GHI, ghi)
+        system_kw = demand * kw_per_kwh_day_at_ghi / local_ghi
+
+        # --- PHASE 2: CAPEX & OPEX MODELING ---
+
+        # 3. CAPEX Calculation with Logistics Penalty
+        # Logic: Projects further from the grid are harder to reach. 
+        # Penalty: Add 10% cost for every 100km distance from the main grid.
+        logistics_mult = 1 + dist * _LOGISTICS_PENALTY_PER_KM
+        capex = system_kw * CAPEX_PER_KW * logistics_mult
+
+        # 4. Operating Expenses & Revenue
+        opex = capex * OPEX_PERCENT
+
+        # Revenue = Annual Energy Sold * Tariff * Collection Rate
+        revenue = customers * revenue_per_customer_yr
+
+        # --- PHASE 3: FINANCIAL METRICS (The "Bankability" Check) ---
+
+        # 5. Cash Flow Analysis
+        annual_cashflow = revenue - opex
+
+        # Metric A: Payback Period (Years)
+        # Logic: How many years to earn back the initial CAPEX?
+        # Handle negative cashflows (projects that lose money) by assigning a Sentinel Value (999);
+        # the division only runs where cashflow is positive.
+        payback = np.full_like(annual_cashflow, 999.0)
+        np.divide(capex, annual_cashflow, out=payback, where=annual_cashflow > 0)
+
+        # Metric B: Net Present Value (NPV)
+        # Logic: Determine the value of future cash flows in today's dollars using the Annuity Formula.
+        # Formula: NPV = -Investment + (Annual_Cashflow * Annuity_Factor)
+        npv = -capex + (annual_cashflow * annuity_factor)
+
+        # Metric C: Simple Yield (First Year ROI)
+        # Sites with 0 (or missing) CAPEX are edge cases with no meaningful yield: reported as 0
+        simple_yield = np.divide(annual_cashflow, capex, out=np.zeros_like(capex), where=capex > 0)
+        simple_yield *= 100
+
+        outputs = (customers, demand, system_kw, capex, opex, revenue, annual_cashflow, payback, npv, simple_yield)
+
+    # Attach every projection column in a single step
+    settlements = settlements.assign(**dict(zip(PROJECTION_COLUMNS, outputs)))
 
     # --- PHASE 4: FILTERING & EXPORT ---
 
     # Definition of "Viable": Positive NPV AND Payback < 7 Years
-    viable_sites = settlements[
-        (settlements['npv_10yr_usd'] > 0) &
-        (settlements['payback_years'] < 7)
-    ].copy()
+    viable_mask = (
+        (settlements['npv_10yr_usd'].to_numpy() > 0) &
+        (settlements['payback_years'].to_numpy() < 7)
+    )
+    viable_idx = np.flatnonzero(viable_mask)
+
+    # The pipeline lists the best sites first: by the scoring model's rank when available, else by NPV
+    if 'rank' in settlements.columns:
+        order = np.argsort(settlements['rank'].to_numpy()[viable_idx], kind='stable')
+    else:
+        order = np.argsort(-settlements['npv_10yr_usd'].to_numpy()[viable_idx], kind='stable')
+    viable_sites = settlements.iloc[viable_idx[order]]
 
     # Formatting for clean output
     cols_to_round = ['system_size_kw', 'capex_estimate_usd', 'revenue_annual_usd', 'npv_10yr_usd', 'payback_years', 'simple_yield_percent']
@@ -116,24 +216,32 @@ def run_financial_projections(input_path, output_dir):
     display_cols = ['name', 'state', 'pop', 'capex_estimate_usd', 'payback_years', 'npv_10yr_usd']
     # Use .get() to handle cases where 'name' or 'state' might be missing in test data
     available_cols = [c for c in display_cols if c in viable_sites.columns]
-    
-    print(viable_sites[available_cols]
-          .sort_values('npv_10yr_usd', ascending=False).head(5))
+
+    # Linear-time selection of the 5 best sites, then only those 5 are sorted
+    npv = viable_sites['npv_10yr_usd'].to_numpy()
+    top_n = min(5, len(npv))
+    top_idx = np.argpartition(-npv, top_n - 1)[:top_n] if top_n else np.arange(0)
+    top_idx = top_idx[np.argsort(-npv[top_idx], kind='stable')]
+    print(viable_sites.iloc[top_idx][available_cols])
 
     # Save Results
     os.makedirs(output_dir, exist_ok=True)
     
     # Save Full Dataset (GeoJSON)
-    settlements.to_file(os.path.join(output_dir, 'financial_projections_full.geojson'), driver='GeoJSON')
+    settlements = gpd.GeoDataFrame(settlements, geometry=geometry)
+    settlements.to_file(os.path.join(output_dir, 'financial_projections_full.geojson'), driver='GeoJSON', engine='pyogrio')
     
-    # Save Viable Pipeline (CSV) for Excel reporting
-    viable_sites.to_csv(os.path.join(output_dir, 'viable_project_pipeline.csv'), index=False)
+    # Save Viable Pipeline (CSV) for Excel reporting (Arrow's C++ writer instead of pandas' row formatting)
+    pa_csv.write_csv(
+        pa.Table.from_pandas(viable_sites, preserve_index=False),
+        os.path.join(output_dir, 'viable_project_pipeline.csv')
+    )
     
     print(f"\nSuccess! Reports saved to: {output_dir}")
 
 if __name__ == "__main__":
     # Define paths
-    INPUT_FILE = './output/scored_settlements.geojson'  # Output from the first script
+    INPUT_FILE = './output/scored_settlements.parquet'  # Output from the first script
     OUTPUT_DIR = './output/financial_reports/'
     
     run_financial_projections(INPUT_FILE, OUTPUT_DIR)
\ No newline at end of file
@@ -0,0 +1,102 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+
+import customer_scoring_algorithm
+from customer_scoring_algorithm import (
+    _normalization_coefficients, calculate_viability_scores, normalize_matrix
+)
+
+
+COMPOSITES_WITHOUT_NIGHTLIGHT = [
+    'market_size_score', 'cost_efficiency_score', 'accessibility_score', 'strategic_value_score'
+]
+
+
+def test_normalize_matrix_isolates_out_of_domain_values():
+    values = np.array([[1.0, 3.0], [-2.0, 3.0], [9.0, 3.0], [4.0, 3.0]], dtype=np.float32)
+
+    with np.errstate(invalid='ignore'):
+        norm = normalize_matrix(values, np.array([True, False]))
+
+    # log1p(-2) is NaN: only that site is affected, the rest of the column is still scaled
+    assert np.isnan(norm[1, 0])
+    assert norm[0, 0] == 0
+    assert norm[2, 0] == 100
+    assert 0 < norm[3, 0] < 100
+    # Columns whose values are all identical get a neutral score
+    assert (norm[:, 1] == 50).all()
+
+
+def test_output_format_follows_extension(tmp_path, make_settlements):
+    make_settlements().to_file(tmp_path / 'raw.geojson', driver='GeoJSON')
+
+    calculate_viability_scores(str(tmp_path / 'raw.geojson'), str(tmp_path / 'scored.geojson'))
+    calculate_viability_scores(str(tmp_path / 'raw.geojson'), str(tmp_path / 'scored.parquet'))
+
+    geojson = gpd.read_file(tmp_path / 'scored.geojson', engine='pyogrio')
+    parquet = gpd.read_parquet(tmp_path / 'scored.parquet')
+    np.testing.assert_allclose(geojson['total_score'], parquet['total_score'], rtol=1e-6)
+
+
+def test_invalid_site_does_not_affect_others(tmp_path, monkeypatch, make_settlements):
+    monkeypatch.setattr(customer_scoring_algorithm, '_score_kernel', None)
+    settlements = make_settlements()
+    settlements.loc[3, 'nightlight_intensity'] = -2
+    settlements.to_file(tmp_path / 'raw.geojson', driver='GeoJSON')
+
+    calculate_viability_scores(str(tmp_path / 'raw.geojson'), str(tmp_path / 'scored.parquet'))
+    scored = gpd.read_parquet(tmp_path / 'scored.parquet')
+
+    # Only the invalid site loses its score, and it gets no tier
+    assert scored['total_score'].isna().tolist() == [i == 3 for i in range(len(scored))]
+    assert scored['viability_tier'].isna().tolist() == [i == 3 for i in range(len(scored))]
+    # ... and only the composite that uses the invalid metric
+    assert scored['revenue_potential_score'].isna().tolist() == [i == 3 for i in range(len(scored))]
+    assert scored[COMPOSITES_WITHOUT_NIGHTLIGHT].notna().all().all()
+
+
+def test_score_kernel_matches_normalize_matrix():
+    pytest.importorskip('numba')
+    rng = np.random.default_rng(1)
+    values = rng.exponential(3, (500, 5)).astype(np.float32)
+    values[:, 2] = 7          # identical column
+    values[10, 0] = -2        # log1p out of domain
+    log_mask = np.array([True, False, False, True, False])
+    reverse_mask = np.array([False, True, True, False, False])
+    anchor_score = rng.integers(0, 101, 500).astype(np.uint8)
+    weight_matrix = rng.random((6, 3)).astype(np.float32)
+    score_weights = np.array([0.5, 0.3, 0.2], dtype=np.float32)
+
+    with np.errstate(invalid='ignore'):
+        kernel_values = values.copy()
+        offset, scale = _normalization_coefficients(kernel_values, log_mask, reverse_mask)
+        composite, total = customer_scoring_algorithm._score_kernel(
+            kernel_values, anchor_score, offset, scale, weight_matrix, score_weights
+        )
+        norm = normalize_matrix(values.copy(), log_mask, reverse_mask)
+    expected = np.hstack([norm, anchor_score[:, np.newaxis].astype(np.float32)]) @ weight_matrix
+
+    np.testing.assert_allclose(composite, expected, rtol=1e-5, atol=1e-3)
+    np.testing.assert_allclose(total, expected @ score_weights, rtol=1e-5, atol=1e-3)
+    assert np.isnan(total).tolist() == [i == 10 for i in range(500)]
+
+
+def test_kernel_and_fallback_scores_agree(tmp_path, monkeypatch, make_settlements):
+    pytest.importorskip('numba')
+    settlements = make_settlements(n=200)
+    settlements.loc[3, 'nightlight_intensity'] = -2
+    settlements.to_file(tmp_path / 'raw.geojson', driver='GeoJSON')
+
+    calculate_viability_scores(str(tmp_path / 'raw.geojson'), str(tmp_path / 'kernel.parquet'))
+    monkeypatch.setattr(customer_scoring_algorithm, '_score_kernel', None)
+    calculate_viability_scores(str(tmp_path / 'raw.geojson'), str(tmp_path / 'fallback.parquet'))
+
+    kernel = gpd.read_parquet(tmp_path / 'kernel.parquet')
+    fallback = gpd.read_parquet(tmp_path / 'fallback.parquet')
+    for column in list(customer_scoring_algorithm.SCORECARD) + ['total_score']:
+        np.testing.assert_allclose(kernel[column], fallback[column], rtol=1e-5, atol=1e-3, err_msg=column)
+    assert kernel['viability_tier'].equals(fallback['viability_tier'])
+    # The invalid metric must not reach the composites that do not use it
+    assert kernel[COMPOSITES_WITHOUT_NIGHTLIGHT].notna().all().all()
+    assert kernel['revenue_potential_score'].isna().tolist() == [i == 3 for i in range(len(kernel))]
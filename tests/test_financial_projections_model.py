@@ -0,0 +1,67 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+
+import financial_projections_model
+from financial_projections_model import PROJECTION_COLUMNS, run_financial_projections
+
+
+def run_projections(settlements, tmp_path, monkeypatch, use_kernel):
+    if not use_kernel:
+        monkeypatch.setattr(financial_projections_model, '_project_financials_kernel', None)
+    input_path = tmp_path / 'scored.parquet'
+    output_dir = tmp_path / ('kernel' if use_kernel else 'numpy')
+    settlements.to_parquet(input_path)
+
+    run_financial_projections(str(input_path), str(output_dir))
+    return gpd.read_file(output_dir / 'financial_projections_full.geojson')
+
+
+def test_kernel_matches_numpy_path(tmp_path, monkeypatch, make_settlements):
+    pytest.importorskip('numba')
+    settlements = make_settlements(n=200)
+    settlements.loc[5, 'solar_ghi'] = np.nan
+    settlements.loc[6, 'solar_ghi'] = 0
+    settlements.loc[7, 'pop'] = 0
+    settlements.loc[8, 'pop'] = np.nan
+
+    # Scenario overrides must reach both paths
+    monkeypatch.setattr(financial_projections_model, 'CUSTOMER_PENETRATION', 0.5)
+    monkeypatch.setattr(financial_projections_model, 'CAPEX_PER_KW', 2000.0)
+    monkeypatch.setattr(financial_projections_model, 'DISCOUNT_RATE', 0.08)
+
+    kernel = run_projections(settlements, tmp_path, monkeypatch, use_kernel=True)
+    fallback = run_projections(settlements, tmp_path, monkeypatch, use_kernel=False)
+
+    for column in PROJECTION_COLUMNS:
+        np.testing.assert_allclose(kernel[column], fallback[column], rtol=1e-12, err_msg=column)
+
+    # Missing population is treated as no customers
+    assert kernel.loc[8, 'estimated_customers'] == 0
+    assert kernel.loc[8, 'capex_estimate_usd'] == 0
+
+    customers_per_person = kernel['estimated_customers'] / settlements['pop'].where(settlements['pop'] > 0)
+    assert customers_per_person.median() == pytest.approx(0.5 / 5, rel=0.01)
+    capex_per_kw = kernel['capex_estimate_usd'] / kernel['system_size_kw']
+    logistics_mult = 1 + settlements['distance_to_grid_km'] * 0.001
+    assert (capex_per_kw / logistics_mult).median() == pytest.approx(2000.0, rel=0.01)
+
+    # NPV uses the overridden discount rate (outputs are rounded to 0.1)
+    annuity_factor = (1 - 1.08 ** -10) / 0.08
+    expected_npv = -kernel['capex_estimate_usd'] + kernel['annual_cashflow_usd'] * annuity_factor
+    np.testing.assert_allclose(kernel['npv_10yr_usd'], expected_npv, atol=1.0)
+
+
+def test_pipeline_lists_best_sites_first(tmp_path, monkeypatch, make_settlements):
+    settlements = make_settlements(n=200)
+    settlements['rank'] = np.random.default_rng(1).permutation(len(settlements)) + 1
+    run_projections(settlements, tmp_path, monkeypatch, use_kernel=False)
+    pipeline = pd.read_csv(tmp_path / 'numpy' / 'viable_project_pipeline.csv')
+    assert len(pipeline) > 1
+    assert pipeline['rank'].is_monotonic_increasing
+
+    # Without a scoring rank, sites are listed by NPV
+    run_projections(settlements.drop(columns='rank'), tmp_path, monkeypatch, use_kernel=False)
+    pipeline = pd.read_csv(tmp_path / 'numpy' / 'viable_project_pipeline.csv')
+    assert pipeline['npv_10yr_usd'].is_monotonic_decreasing